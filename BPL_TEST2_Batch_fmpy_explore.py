@@ -32,6 +32,10 @@
 # 2024-05-14 - Polish the script
 # 2024-05-20 - Updated the OpenModelica version to 1.23.0-dev
 # 2024-06-01 - Corrected model_get() to handle string values as well - improvement very small and keep ver 1.0.0
+# 2026-10-15 - Read model_description only once and reuse it in system_info()
+# 2026-10-15 - Introduced variableDict for lookup by name in model_get() and related functions
+# 2026-10-15 - Diagram commands are compiled once and the code reused by show() and simu()
+# 2026-10-15 - The FMU is extracted once and the FMU instance reused by simu()
 #------------------------------------------------------------------------------------------------------------------
 
 #------------------------------------------------------------------------------------------------------------------
@@ -46,12 +50,19 @@ import numpy as np
 import matplotlib.pyplot as plt 
 import matplotlib.image as img
 import zipfile
+import re
+import shutil
+import atexit
 
 from fmpy import simulate_fmu
 from fmpy import read_model_description
+from fmpy import extract
+from fmpy import instantiate_fmu
 import fmpy as fmpy
 
 from itertools import cycle
+from itertools import chain
+from functools import lru_cache
 from importlib.metadata import version   
 
 # Set the environment - for Linux a JSON-file in the FMU is read
@@ -66,39 +77,74 @@ global fmu_model, model, opts
 if platform.system() == 'Windows':
    print('Windows - run FMU pre-compiled JModelica 2.14')
    fmu_model ='BPL_TEST2_Batch_windows_jm_cs.fmu'
-   model_description = read_model_description(fmu_model)        
    flag_vendor = 'JM' 
    flag_type = 'CS'
 elif platform.system() == 'Linux':
    print('Linux - run FMU pre-compiled OpenModelica 1.23.0-dev')
    fmu_model ='BPL_TEST2_Batch_linux_om_me.fmu'  
-   model_description = read_model_description(fmu_model)  
    flag_vendor = 'OM' 
    flag_type = 'ME'
 else:    
    print('There is no FMU for this platform')
 
+# Extract the FMU once and read model_description from there - reused everywhere below
+unzipdir = extract(fmu_model)
+model_description = read_model_description(unzipdir)
+
 # Provide various opts-profiles
 if flag_type in ['CS', 'cs']:
    opts_std = {'ncp': 500}
+   fmi_type = 'CoSimulation'
 elif flag_type in ['ME', 'me']:
    opts_std = {'ncp': 500}
+   fmi_type = 'ModelExchange'
 else:    
    print('There is no FMU for this platform')
 
-# Extract model_description from fmu_model
-model_description = read_model_description(fmu_model)
+# FMU instance kept between simulations - created at first simu() and reset for the following
+global fmu_instance; fmu_instance = None
+
+def fmu_instance_reset():
+   """Return the FMU instance ready for a new simulation"""
+   global fmu_instance
+   if fmu_instance is None:
+      fmu_instance = instantiate_fmu(unzipdir, model_description, fmi_type)
+   else:
+      fmu_instance.reset()
+   return fmu_instance
+
+# Free the FMU instance and remove the extracted FMU when Python exits
+def fmu_cleanup():
+   if fmu_instance is not None: fmu_instance.freeInstance()
+   shutil.rmtree(unzipdir, ignore_errors=True)
+
+atexit.register(fmu_cleanup)
+
+# Dictionary of model variables by name for direct lookup in model_get() etc
+variableDict = {v.name: v for v in model_description.modelVariables}
+
+# List of local variables in the model, used by simu() to extract variables to be stored
+localVariables = [v for v in model_description.modelVariables if v.causality == 'local']
+localVariableNameSet = {v.name for v in localVariables}
+
+# Pattern for variable names used as sim_res['name'] in diagram commands
+diagramVariablePattern = re.compile(r"""\[['"]([^'"]+)['"]\]""")
+
+# Pattern for the first component of a variable name and components ignored, used by describe_parts()
+componentPattern = re.compile(r'[^.(]*')
+componentsIgnored = {'', 'der', 'BPL', 'Customer', 'today[1]', 'today[2]', 'today[3]',
+                     'temp_1', 'temp_2', 'temp_3', 'temp_4', 'temp_5', 'temp_6', 'temp_7'}
 
 # Provide various MSL and BPL versions
 if flag_vendor in ['JM', 'jm']:
 #   MSL_usage = model.get('MSL.usage')[0]
-   constants = [v for v in model_description.modelVariables if v.causality == 'local'] 
-   MSL_usage = [x[1] for 
-      x in [(constants[k].name, constants[k].start) for k in range(len(constants))] if 'MSL.usage' in x[0]][0]   
-   MSL_version = [x[1] for 
-      x in [(constants[k].name, constants[k].start) for k in range(len(constants))] if 'MSL.version' in x[0]][0]
-   BPL_version = [x[1] for 
-      x in [(constants[k].name, constants[k].start) for k in range(len(constants))] if 'BPL.version' in x[0]][0] 
+   constants = {'MSL.usage': None, 'MSL.version': None, 'BPL.version': None}
+   for v in localVariables:
+      for key in constants.keys():
+         if constants[key] is None and key in v.name: constants[key] = v.start
+   MSL_usage = constants['MSL.usage']
+   MSL_version = constants['MSL.version']
+   BPL_version = constants['BPL.version']
 elif flag_vendor in ['OM', 'om']:
    MSL_usage = '3.2.3 - used components: none' 
    MSL_version = '3.2.3'
@@ -130,28 +176,25 @@ stateDict = {variable.derivative.name:None for variable in model_description.mod
 stateDict.update(timeDiscreteStates) 
 
 global stateDictInitial; stateDictInitial = {}
+statePattern = re.compile(r'^(.+?)(\[[^\]]+\])?$')
 for key in stateDict.keys():
-    if not key[-1] == ']':
-         if key[-3:] == 'I.y':
-            stateDictInitial[key] = key[:-10]+'I_start'
-         elif key[-3:] == 'D.x':
-            stateDictInitial[key] = key[:-10]+'D_start'
-         else:
-            stateDictInitial[key] = key+'_start'
-    elif key[-3] == '[':
-        stateDictInitial[key] = key[:-3]+'_start'+key[-3:]
-    elif key[-4] == '[':
-        stateDictInitial[key] = key[:-4]+'_start'+key[-4:]
-    elif key[-5] == '[':
-        stateDictInitial[key] = key[:-5]+'_start'+key[-5:] 
+    base, index = statePattern.match(key).groups()
+    if index is not None:
+        stateDictInitial[key] = base+'_start'+index
+    elif base[-3:] == 'I.y':
+        stateDictInitial[key] = base[:-10]+'I_start'
+    elif base[-3:] == 'D.x':
+        stateDictInitial[key] = base[:-10]+'D_start'
     else:
-        print('The state vector has more than 1000 states')
-        break
+        stateDictInitial[key] = base+'_start'
 
 global stateDictInitialLoc; stateDictInitialLoc = {}
 for value in stateDictInitial.values():
     stateDictInitialLoc[value] = value
 
+# Set of initial value locations of the states, used by simu() in mode 'cont'
+global stateDictInitialSet; stateDictInitialSet = set(stateDictInitial.values())
+
 # Create dictionaries parDict[] and parLocation[]
 global parDict; parDict = {}
 parDict['V_start'] = 1.0
@@ -173,10 +216,10 @@ parLocation['Ks'] = 'bioreactor.culture.Ks'
 
 # Extra only for describe()
 global key_variables; key_variables = []
-parLocation['mu'] = 'bioreactor.culture.mu'; key_variables.append(parLocation['mu'])
-parLocation['V'] = 'bioreactor.V'; key_variables.append(parLocation['V'])
-parLocation['VX'] = 'bioreactor.m[1]'; key_variables.append(parLocation['VX'])
-parLocation['VS'] = 'bioreactor.m[2]'; key_variables.append(parLocation['VS'])
+_parLocationExtra = {'mu': 'bioreactor.culture.mu', 'V': 'bioreactor.V', 
+                     'VX': 'bioreactor.m[1]', 'VS': 'bioreactor.m[2]'}
+parLocation.update(_parLocationExtra)
+key_variables.extend(_parLocationExtra.values())
 
 # Parameter value check - especially for hysteresis to avoid runtime error
 global parCheck; parCheck = []
@@ -337,6 +380,12 @@ def describe(name, decimals=3):
 FMU_explore = 'FMU-explore for FMPy version 1.0.0'
 #------------------------------------------------------------------------------------------------------------------
 
+# Compile requirements in parCheck once - the code objects are reused by par()
+@lru_cache(maxsize=32)
+def requirement_code(requirement):
+   """Return compiled code of a requirement in parCheck"""
+   return compile(requirement, '<parCheck>', 'eval')
+
 # Define function par() for parameter update
 def par(parDict=parDict, parCheck=parCheck, parLocation=parLocation, *x, **x_kwarg):
    """ Set parameter values if available in the predefined dictionaryt parDict. """
@@ -349,7 +398,8 @@ def par(parDict=parDict, parCheck=parCheck, parLocation=parLocation, *x, **x_kwa
          print('Error:', key, '- seems not an accessible parameter - check the spelling')
    parDict.update(x_temp)
    
-   parErrors = [requirement for requirement in parCheck if not(eval(requirement))]
+   parErrors = [requirement for requirement in parCheck 
+                if not(eval(requirement_code(requirement), globals(), {'parDict': parDict}))]
    if not parErrors == []:
       print('Error - the following requirements do not hold:')
       for index, item in enumerate(parErrors): print(item)
@@ -368,64 +418,54 @@ def init(parDict=parDict, *x, **x_kwarg):
    parDict.update(x_init)
 
 # Define fuctions similar to pyfmi model.get(), model.get_variable_descirption(), model.get_variable_unit()
-def model_get(parLoc, model_description=model_description):
+def model_get(parLoc, variableDict=variableDict):
    """ Function corresponds to pyfmi model.get() but returns just a value and not a list"""
-   par_var = model_description.modelVariables
-   for k in range(len(par_var)):
-      if par_var[k].name == parLoc:
+   par_var = variableDict.get(parLoc)
+   if par_var is None:
+      return None
+   try:
+      if par_var.name in start_values.keys():
+         return start_values[par_var.name]
+      elif par_var.variability in ['constant', 'fixed']: 
+         if par_var.type in ['Integer', 'Real']: 
+            return float(par_var.start)      
+         if par_var.type in ['String']: 
+            return par_var.start                        
+      elif par_var.variability == 'continuous':
          try:
-            if par_var[k].name in start_values.keys():
-                  value = start_values[par_var[k].name]
-            elif par_var[k].variability in ['constant', 'fixed']: 
-               if par_var[k].type in ['Integer', 'Real']: 
-                  value = float(par_var[k].start)      
-               if par_var[k].type in ['String']: 
-                  value = par_var[k].start                        
-            elif par_var[k].variability == 'continuous':
-               try:
-                  timeSeries = sim_res[par_var[k].name]
-                  value = timeSeries[-1]
-               except (AttributeError, ValueError):
-                  value = None
-                  print('Variable not logged')
-            else:
-               value = None
-         except NameError:
-            print('Error: Information available after first simution')
-            value = None          
-   return value
+            timeSeries = sim_res[par_var.name]
+            return timeSeries[-1]
+         except (AttributeError, ValueError):
+            print('Variable not logged')
+   except NameError:
+      print('Error: Information available after first simution')
+   return None
    
-def model_get_variable_description(parLoc, model_description=model_description):
+def model_get_variable_description(parLoc, variableDict=variableDict):
    """ Function corresponds to pyfmi model.get_variable_description() but returns just a value and not a list"""
-   par_var = model_description.modelVariables
-#   value = [x[1] for x in [(par_var[k].name, par_var[k].description) for k in range(len(par_var))] if parLoc in x[0]]
-   value = [x.description for x in par_var if parLoc in x.name]   
-   return value[0]
+   return variableDict[parLoc].description
    
-def model_get_variable_unit(parLoc, model_description=model_description):
+def model_get_variable_unit(parLoc, variableDict=variableDict):
    """ Function corresponds to pyfmi model.get_variable_unit() but returns just a value and not a list"""
-   par_var = model_description.modelVariables
-#   value = [x[1] for x in [(par_var[k].name, par_var[k].unit) for k in range(len(par_var))] if parLoc in x[0]]
-   value = [x.unit for x in par_var if parLoc in x.name]
-   return value[0]
+   return variableDict[parLoc].unit
       
 # Define function disp() for display of initial values and parameters
 def disp(name='', decimals=3, mode='short'):
    """ Display intial values and parameters in the model that include "name" and is in parLocation list.
        Note, it does not take the value from the dictionary par but from the model. """
    
-   def dict_reverser(d):
-      seen = set()
-      return {v: k for k, v in d.items() if v not in seen or seen.add(v)}
+   # Reverse of parLocation and list of locations of parDict, built once per call
+   parLocationInverse = {v: k for k, v in parLocation.items()}
+   parDictLocations = [parLocation[k] for k in parDict.keys()]
    
    if mode in ['short']:
       k = 0
-      for Location in [parLocation[k] for k in parDict.keys()]:
+      for Location in parDictLocations:
          if name in Location:
             if type(model_get(Location)) != np.bool_:
-               print(dict_reverser(parLocation)[Location] , ':', np.round(model_get(Location),decimals))
+               print(parLocationInverse[Location] , ':', np.round(model_get(Location),decimals))
             else:
-               print(dict_reverser(parLocation)[Location] , ':', model_get(Location))               
+               print(parLocationInverse[Location] , ':', model_get(Location))               
          else:
             k = k+1
       if k == len(parLocation):
@@ -438,17 +478,17 @@ def disp(name='', decimals=3, mode='short'):
 
    if mode in ['long','location']:
       k = 0
-      for Location in [parLocation[k] for k in parDict.keys()]:
+      for Location in parDictLocations:
          if name in Location:
             if type(model_get(Location)) != np.bool_:       
-               print(Location,':', dict_reverser(parLocation)[Location] , ':', np.round(model_get(Location),decimals))
+               print(Location,':', parLocationInverse[Location] , ':', np.round(model_get(Location),decimals))
          else:
             k = k+1
       if k == len(parLocation):
          for parName in parDict.keys():
             if name in parName:
                if type(model_get(Location)) != np.bool_:
-                  print(parLocation[parName], ':', dict_reverser(parLocation)[Location], ':', parName,':', 
+                  print(parLocation[parName], ':', parLocationInverse[Location], ':', parName,':', 
                      np.round(model_get(parLocation[parName]),decimals))
 
 # Line types
@@ -457,13 +497,31 @@ def setLines(lines=['-','--',':','-.']):
    global linecycler
    linecycler = cycle(lines)
 
+# Compile diagram commands once - the code objects are reused by show() and simu()
+@lru_cache(maxsize=32)
+def diagram_code(command):
+   """Return compiled code of a diagram command from newplot()"""
+   return compile(command, '<diagram>', 'eval')
+
 # Show plots from sim_res, just that
 def show(diagrams=diagrams):
    """Show diagrams chosen by newplot()"""
    # Plot pen
    linetype = next(linecycler)    
    # Plot diagrams 
-   for command in diagrams: eval(command)
+   for command in diagrams: eval(diagram_code(command))
+
+# Extract local variables used in the diagram commands
+def extract_variables(diagrams):
+   """Return local variables of the model that are plotted by the diagrams"""
+   names = diagramVariablePattern.findall('\n'.join(diagrams))
+   return [name for name in dict.fromkeys(names) if name in localVariableNameSet]
+
+# Variables to be stored by simu() - cached as long as diagrams, states and key variables are the same
+@lru_cache(maxsize=32)
+def simulation_output(diagrams, states, key_variables):
+   """Return tuple of variables to be stored in sim_res, arguments given as tuples"""
+   return tuple(dict.fromkeys(chain(extract_variables(diagrams), states, key_variables)))
 
 # Define simulation
 def simu(simulationTime=simulationTime, mode='Initial', options=opts_std, diagrams=diagrams):
@@ -475,15 +533,8 @@ def simu(simulationTime=simulationTime, mode='Initial', options=opts_std, diagra
    # Simulation flag
    simulationDone = False
    
-   # Internal help function to extract variables to be stored
-   def extract_variables(diagrams):
-       output = []
-       variables = [v for v in model_description.modelVariables if v.causality == 'local']
-       for j in range(len(diagrams)):
-           for k in range(len(variables)):
-               if variables[k].name in diagrams[j]:
-                   output.append(variables[k].name)
-       return output
+   # Variables to be stored - the same for both modes
+   output = simulation_output(tuple(diagrams), tuple(stateDict.keys()), tuple(key_variables))
 
    # Run simulation
    if mode in ['Initial', 'initial', 'init']: 
@@ -492,15 +543,18 @@ def simu(simulationTime=simulationTime, mode='Initial', options=opts_std, diagra
       
       # Simulate
       sim_res = simulate_fmu(
-         filename = fmu_model,
+         filename = unzipdir,
          validate = False,
+         fmi_type = fmi_type,
+         model_description = model_description,
+         fmu_instance = fmu_instance_reset(),
          start_time = 0,
          stop_time = simulationTime,
          output_interval = simulationTime/options['ncp'],
          record_events = True,
          start_values = start_values,
          fmi_call_logger = None,
-         output = list(set(extract_variables(diagrams) + list(stateDict.keys()) + key_variables))
+         output = output
       )
       
       simulationDone = True
@@ -512,12 +566,8 @@ def simu(simulationTime=simulationTime, mode='Initial', options=opts_std, diagra
          
       else:         
          # Update parDictMod and create parLocationMod
-         parDictRed = parDict.copy()
-         parLocationRed = parLocation.copy()
-         for key in parDict.keys():
-            if parLocation[key] in stateDictInitial.values(): 
-               del parDictRed[key]  
-               del parLocationRed[key]
+         parDictRed = {k:v for k,v in parDict.items() if parLocation[k] not in stateDictInitialSet}
+         parLocationRed = {k:parLocation[k] for k in parDictRed.keys()}
          parLocationMod = dict(list(parLocationRed.items()) + list(stateDictInitialLoc.items()))
    
          # Create parDictMod and parLocationMod
@@ -528,15 +578,18 @@ def simu(simulationTime=simulationTime, mode='Initial', options=opts_std, diagra
   
          # Simulate
          sim_res = simulate_fmu(
-            filename = fmu_model,
+            filename = unzipdir,
             validate = False,
+            fmi_type = fmi_type,
+            model_description = model_description,
+            fmu_instance = fmu_instance_reset(),
             start_time = prevFinalTime,
             stop_time = prevFinalTime + simulationTime,
             output_interval = simulationTime/options['ncp'],
             record_events = True,
             start_values = start_values,
             fmi_call_logger = None,
-            output = list(set(extract_variables(diagrams) + list(stateDict.keys()) + key_variables))
+            output = output
          )
       
          simulationDone = True
@@ -548,10 +601,10 @@ def simu(simulationTime=simulationTime, mode='Initial', options=opts_std, diagra
       
       # Plot diagrams from simulation
       linetype = next(linecycler)    
-      for command in diagrams: eval(command)
+      for command in diagrams: eval(diagram_code(command))
    
-      # Store final state values in stateDict:        
-      for key in stateDict.keys(): stateDict[key] = model_get(key)  
+      # Store final state values in stateDict - all states are stored in sim_res:        
+      for key in stateDict.keys(): stateDict[key] = sim_res[key][-1]  
          
       # Store time from where simulation will start next time
       prevFinalTime = sim_res['time'][-1]
@@ -564,28 +617,15 @@ def describe_parts(component_list=[]):
    """List all parts of the model""" 
        
    def model_component(variable_name):
-      i = 0
-      name = ''
-      finished = False
-      if not variable_name[0] == '_':
-         while not finished:
-            name = name + variable_name[i]
-            if i == len(variable_name)-1:
-                finished = True 
-            elif variable_name[i+1] in ['.', '(']: 
-                finished = True
-            else: 
-                i=i+1
-      if name in ['der', 'temp_1', 'temp_2', 'temp_3', 'temp_4', 'temp_5', 'temp_6', 'temp_7']: name = ''
-      return name
+      if variable_name[0] == '_': return ''
+      return componentPattern.match(variable_name).group()
     
 #   variables = list(model.get_model_variables().keys())
    variables = [v.name for v in model_description.modelVariables]
         
-   for i in range(len(variables)):
-      component = model_component(variables[i])
-      if (component not in component_list) \
-      & (component not in ['','BPL', 'Customer', 'today[1]', 'today[2]', 'today[3]', 'temp_2', 'temp_3']):
+   for variable in variables:
+      component = model_component(variable)
+      if (component not in component_list) and (component not in componentsIgnored):
          component_list.append(component)
       
    print(sorted(component_list, key=str.casefold))
@@ -668,7 +708,6 @@ def BPL_info():
 def system_info():
    """Print system information"""
 #   FMU_type = model.__class__.__name__
-   constants = [v for v in model_description.modelVariables if v.causality == 'local']
    
    print()
    print('System information')
@@ -680,14 +719,14 @@ def system_info():
    except NameError:
        print(' -Scipy: not installed in the notebook')
    print(' -FMPy:', version('fmpy'))
-   print(' -FMU by:', read_model_description(fmu_model).generationTool)
-   print(' -FMI:', read_model_description(fmu_model).fmiVersion)
+   print(' -FMU by:', model_description.generationTool)
+   print(' -FMI:', model_description.fmiVersion)
    if model_description.modelExchange is None:
       print(' -Type: CS')
    else:
       print(' -Type: ME')
-   print(' -Name:', read_model_description(fmu_model).modelName)
-   print(' -Generated:', read_model_description(fmu_model).generationDateAndTime)
+   print(' -Name:', model_description.modelName)
+   print(' -Generated:', model_description.generationDateAndTime)
    print(' -MSL:', MSL_version)    
    print(' -Description:', BPL_version)   
    print(' -Interaction:', FMU_explore)